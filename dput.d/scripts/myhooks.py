@@ -2,7 +2,12 @@
 # https://git.launchpad.net/~ubuntu-server/+git/ubuntu-helpers/tree/cpaelzer/.dput.d/scripts/mymistakes.py
 
 import re
+import json
+import threading
 from pathlib import Path
+from functools import lru_cache
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 import distro_info
 from dput.exceptions import HookException
@@ -15,6 +20,115 @@ yellow = Color('yellow')
 green = Color('green')
 
 
+# All the hooks run in a single dput process, so the following are created
+# lazily and shared between them (and between multiple uploads)
+
+@lru_cache()
+def ubuntu_info():
+    return distro_info.UbuntuDistroInfo()
+
+
+@lru_cache()
+def devel_series():
+    try:
+        return ubuntu_info().devel()
+    except distro_info.DistroDataOutdated:
+        # Recent release; just use last supported
+        return ubuntu_info().supported()[-1]
+
+
+cache_dir = Path.home() / '.cache' / 'ubuntu-dev-tools'
+lp_root = 'https://api.launchpad.net/devel/'
+
+
+_local = threading.local()
+_login_lock = threading.Lock()
+def launchpad():
+    """
+    Return an anonymous launchpad session for the calling thread;
+    launchpadlib isn't thread-safe so each thread gets its own. Logins are
+    serialized as the sessions share an on-disk cache.
+    """
+    try:
+        return _local.lp
+    except AttributeError:
+        with _login_lock:
+            _local.lp = Launchpad.login_anonymously(
+                'dput-ng', 'production', str(cache_dir), version='devel')
+        return _local.lp
+
+
+@lru_cache()
+def executor(jobs=8):
+    # Shared by every call to get_bugs so that its threads, and thus their
+    # launchpad sessions, persist between hooks; threads are only started as
+    # concurrent work requires them
+    return ThreadPoolExecutor(max_workers=jobs)
+
+
+Bug = namedtuple('Bug', ('id', 'title', 'description', 'target_links'))
+
+
+_bugs = {}
+def get_bugs(bug_ids, *, jobs=8, cache_path=cache_dir / 'dput-bugs.json'):
+    """
+    Return a list of :class:`Bug` for each of *bug_ids*, fetching any not
+    already retrieved by this process concurrently (with up to *jobs*
+    threads).
+
+    Bugs are also cached in *cache_path* along with the date they were last
+    updated. Each bug is always fetched again (so a description or task fixed
+    just before re-uploading is seen), but its task targets are only fetched
+    again if the bug has been updated. If launchpad can't be reached, cached
+    entries are used regardless of age.
+    """
+    try:
+        cache = json.loads(cache_path.read_text(encoding='utf-8'))
+    except (FileNotFoundError, ValueError):
+        cache = {}
+    missing = [bug_id for bug_id in bug_ids if bug_id not in _bugs]
+    if missing:
+        try:
+            for bug_id, entry in zip(missing, executor(jobs).map(
+                _get_bug, missing, [cache.get(str(b)) for b in missing]
+            )):
+                cache[str(bug_id)] = entry
+                _bugs[bug_id] = _cached_bug(bug_id, entry)
+        except Exception as err:
+            if not all(str(bug_id) in cache for bug_id in missing):
+                raise
+            warn(f'unable to query launchpad ({err}); using cached bugs')
+            for bug_id in missing:
+                _bugs.setdefault(bug_id, _cached_bug(bug_id, cache[str(bug_id)]))
+        else:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_name(cache_path.name + '.new')
+            temp_path.write_text(json.dumps(cache), encoding='utf-8')
+            temp_path.replace(cache_path)
+    return [_bugs[bug_id] for bug_id in bug_ids]
+
+
+def _cached_bug(bug_id, entry):
+    return Bug(
+        bug_id, entry['title'], entry['description'],
+        set(entry['target_links']))
+
+
+def _get_bug(bug_id, entry):
+    bug = launchpad().bugs[bug_id]
+    updated = bug.date_last_updated.isoformat()
+    if entry is not None and entry['updated'] == updated:
+        target_links = entry['target_links']
+    else:
+        target_links = sorted({task.target_link for task in bug.bug_tasks})
+    return {
+        'updated': updated,
+        'title': bug.title,
+        'description': bug.description,
+        'target_links': target_links,
+    }
+
+
 def stop(message):
     raise HookException(f'{red}STOP{red:0}: {message}')
 
@@ -83,69 +197,48 @@ def check_bug_sru(changes, profile, interface):
     If upload is targetting an older release, ensure all bugs marked fixed
     follow the SRU template.
     """
-    source_pkg_type = 'https://api.launchpad.net/devel/#source_package'
-    info = distro_info.UbuntuDistroInfo()
     # Strip pockets (-proposed, -backports, ...)
     codename, *_ = changes['Distribution'].split('-')
-    try:
-        devel_series = info.devel()
-    except distro_info.DistroDataOutdated:
-        # Recent release; just use last supported
-        devel_series = info.supported()[-1]
-    if codename != devel_series:
+    if codename != devel_series():
         # This is an SRU (probably?)
-        bug_ids = {
+        bug_ids = sorted({
             int(num)
             for num in changes.get('Launchpad-Bugs-Fixed', '').split()
-        }
-        cache_dir = Path.home() / '.cache' / 'ubuntu-dev-tools'
-        lp = Launchpad.login_anonymously(
-            'dput-ng', 'production', str(cache_dir), version='devel')
-        ubuntu = lp.distributions['ubuntu']
-        distro_series = ubuntu.getSeries(name_or_version=codename)
-
-        for bug_id in bug_ids:
-            bug = lp.bugs[bug_id]
+        })
+        # The target of a source package task in the series; comparing links
+        # avoids fetching the target of every task (or even the series)
+        source_link = f'{lp_root}ubuntu/{codename}/+source/{changes["Source"]}'
+
+        # Fetch all the bugs before we start asking questions
+        for bug in get_bugs(bug_ids):
             if not matches_sru_template(bug):
-                message = f'Upload without SRU template in LP: #{bug_id}?'
+                message = f'Upload without SRU template in LP: #{bug.id}?'
                 if not ask(interface, message):
-                    stop(f'missing SRU template in LP: #{bug_id}')
-            for task in bug.bug_tasks:
-                if task.target.resource_type_link != source_pkg_type:
-                    continue
-                if task.target.distribution != ubuntu:
-                    continue
-                if task.target.distroseries != distro_series:
-                    continue
-                if task.target.name != changes['Source']:
-                    continue
-                break
-            else:
+                    stop(f'missing SRU template in LP: #{bug.id}')
+            if source_link not in bug.target_links:
                 message = (
                     f'Upload with no target for {changes["Source"]} in '
-                    f'Ubuntu {distro_series.name}?')
+                    f'Ubuntu {codename}?')
                 if not ask(interface, message):
-                    stop(f'missing target for Ubuntu {distro_series.name}')
+                    stop(f'missing target for Ubuntu {codename}')
 
 
+sru_heading_re = re.compile(
+    r'\[ *(?:'
+    r'(?P<impact>(?:User )?Impact)|'
+    r'(?P<testing>Test (?:Plan|Case)|Testing)|'
+    r'(?P<regression>What Can Go Wrong|Where Things Could Go Wrong|'
+    r'Where Problems Could Occur|Regression Potential)'
+    r') *\]', re.IGNORECASE)
 def matches_sru_template(bug):
     """
     Checks if the specified *bug* matches the typical SRU template (title
     and headings in the description)
     """
-    return (
-        '[SRU]' in bug.title and (
-            re.search(r'\[ *(User )?Impact *\]', bug.description, re.IGNORECASE)
-        ) and (
-            re.search(r'\[ *Test (Plan|Case) *\]', bug.description, re.IGNORECASE) or
-            re.search(r'\[ *Testing *\]', bug.description, re.IGNORECASE)
-        ) and (
-            re.search(r'\[ *What Can Go Wrong *\]', bug.description, re.IGNORECASE) or
-            re.search(r'\[ *Where Things Could Go Wrong *\]', bug.description, re.IGNORECASE) or
-            re.search(r'\[ *Where Problems Could Occur *\]', bug.description, re.IGNORECASE) or
-            re.search(r'\[ *Regression Potential *\]', bug.description, re.IGNORECASE)
-        )
-    )
+    return '[SRU]' in bug.title and {
+        match.lastgroup
+        for match in sru_heading_re.finditer(bug.description)
+    } >= {'impact', 'testing', 'regression'}
 
 
 def check_update_maintainer(changes, profile, interface):
@@ -189,10 +282,9 @@ def check_ubuntu_release(changes, profile, interface):
     # a suffix
     ver_release = ver_release[-1]
 
-    info = distro_info.UbuntuDistroInfo()
     # Strip pockets (-proposed, -backports, ...)
     codename, *_ = changes['Distribution'].split('-')
-    dist_release = info.version(codename)
+    dist_release = ubuntu_info().version(codename)
     # LTS versions are represented as, for example, "20.04 LTS"
     if dist_release.endswith(' LTS'):
         dist_release = dist_release[:-4]
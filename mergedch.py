@@ -3,7 +3,15 @@
 import re
 import sys
 import argparse
-from textwrap import dedent, wrap
+from os.path import commonprefix
+from hashlib import blake2b
+from functools import lru_cache, partial
+from itertools import islice
+from textwrap import TextWrapper
+from tempfile import TemporaryFile
+from contextlib import nullcontext
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 
 def split_entries(source, delimiter='### END ###'):
@@ -20,17 +28,15 @@ def split_entries(source, delimiter='### END ###'):
         yield entry
 
 
+bugs_re = re.compile(r'(\b *)?(\()?(, *)?LP: *#\d+(, *)?(?(2)\)|)')
 def filter_items(entry, tags='*+-'):
     tags = tuple(tags)
-    bugs_re = re.compile(r'(\b *)?(\()?(, *)?LP: *#\d+(, *)?(?(2)\)|)')
     for line in entry:
         if line.strip():
-            if line.lstrip().startswith(tags):
-                yield bugs_re.sub('', line)
-            elif line.startswith(' '):
-                yield bugs_re.sub('', line)
-            else:
-                pass
+            if line.lstrip().startswith(tags) or line.startswith(' '):
+                # The substitution is relatively expensive; skip it for the
+                # majority of lines which don't reference bugs
+                yield bugs_re.sub('', line) if 'LP:' in line else line
 
 
 def split_items(entry, tags='*+-'):
@@ -43,24 +49,191 @@ def split_items(entry, tags='*+-'):
 
     tags = tuple(tags)
     strip_chars = ''.join(tags + (' ', '\t'))
+    # Equivalent to dedent, without re-joining and re-splitting the entry;
+    # whitespace-only lines are ignored
+    entry = [line for line in entry if line.strip()]
+    margin = commonprefix([
+        line[:len(line) - len(line.lstrip())] for line in entry])
     lines = []
-    entry = dedent('\n'.join(entry))
-    for line in entry.splitlines():
+    for line in entry:
+        line = line[len(margin):]
         if line.lstrip().startswith(tags):
             yield from make_item()
             lines = [line]
         elif line.startswith(' '):
             lines.append(line.strip())
-        elif line:
+        else:
             assert False
     yield from make_item()
 
 
+@lru_cache()
+def _wrapper(width, initial_indent, subsequent_indent):
+    return TextWrapper(
+        width=width, initial_indent=initial_indent,
+        subsequent_indent=subsequent_indent)
+
+
 def format_item(item, bullet='-', indent=0, width=78):
-    yield from wrap(
-        item, width=width,
-        initial_indent=' ' * indent + bullet + ' ',
-        subsequent_indent=' ' * (indent + len(bullet) + 1))
+    yield from _wrapper(
+        width, ' ' * indent + bullet + ' ',
+        ' ' * (indent + len(bullet) + 1)).wrap(item)
+
+
+def format_entry(entry, bullet='-', indent=0, width=78):
+    """
+    Return the formatted items of *entry* (a list of lines) as a single
+    string.
+    """
+    return ''.join(
+        format_items(split_items(filter_items(entry)), bullet=bullet,
+                     indent=indent, width=width))
+
+
+def format_items(items, bullet='-', indent=0, width=78):
+    """
+    Return the formatted lines of *items*, a sequence of (indent, text)
+    tuples as produced by :func:`split_items`, as a single string.
+    """
+    return ''.join(
+        line + '\n'
+        for item_indent, item in items
+        for line in format_item(
+            item, bullet=bullet, indent=indent + item_indent, width=width)
+    )
+
+
+def entry_items(entry):
+    return list(split_items(filter_items(entry)))
+
+
+def item_units(items):
+    """
+    Yield lists of *items* (tuples of indent and text), each consisting of an
+    item and all the more-indented sub-items which follow it.
+    """
+    unit = []
+    for indent, text in items:
+        if unit and indent <= unit[0][0]:
+            yield unit
+            unit = []
+        unit.append((indent, text))
+    if unit:
+        yield unit
+
+
+def dedup_items(items, max_seen=1000000):
+    """
+    Yield each of *items* (tuples of indent and text) unless an equivalent
+    item, with equivalent sub-items, has already been seen; an item and its
+    sub-items are kept or dropped together. They are compared by a hash of
+    their normalised text, ignoring whitespace, case, any trailing full-stop,
+    and all but the relative indentation of sub-items. To bound memory use,
+    only the last *max_seen* hashes are remembered.
+    """
+    seen = set()
+    order = deque()
+    for unit in item_units(items):
+        key = blake2b(digest_size=8)
+        for indent, text in unit:
+            key.update(
+                f'{indent - unit[0][0]}\t'
+                f'{" ".join(text.split()).rstrip(".").casefold()}\n'
+                .encode('utf-8'))
+        key = key.digest()
+        if key not in seen:
+            seen.add(key)
+            order.append(key)
+            if len(order) > max_seen:
+                seen.discard(order.popleft())
+            yield from unit
+
+
+component_re = re.compile(
+    r'(?P<component>[^\s:,]*[/.][^\s:,]*(, *[^\s:,]*[/.][^\s:,]*)*): +'
+    r'(?P<text>.+)')
+def group_items(items):
+    """
+    Yield each of *items* (tuples of indent and text) that doesn't start with
+    a component (a file, or comma-separated files, followed by a colon, like
+    "debian/control: ..."). Then, for each component mentioned, yield an item
+    for the component followed by all the items that mentioned it, indented
+    beneath it. Sub-items always move with the item they belong to.
+
+    Grouped items are spilled to a temporary file as they are found, so only
+    the components and file offsets of their items are held in memory.
+    """
+    groups = {}
+    with TemporaryFile() as spill:
+        for unit in item_units(items):
+            indent, text = unit[0]
+            match = component_re.fullmatch(text)
+            if match is None:
+                yield from unit
+            else:
+                group_indent, offsets = groups.setdefault(
+                    match.group('component'), (indent, []))
+                offsets.append((spill.tell(), len(unit)))
+                spill.write(f'0\t{match.group("text")}\n'.encode('utf-8'))
+                for sub_indent, sub_text in unit[1:]:
+                    spill.write(
+                        f'{sub_indent - indent}\t{sub_text}\n'.encode('utf-8'))
+        for component, (indent, offsets) in groups.items():
+            yield indent, f'{component}:'
+            for offset, count in offsets:
+                spill.seek(offset)
+                for line in islice(spill, count):
+                    sub_indent, text = line[:-1].decode('utf-8').split('\t', 1)
+                    yield indent + 2 + int(sub_indent), text
+
+
+def imap(executor, func, iterable, batch_size=16384):
+    """
+    Yield the result of *func* for each of *iterable*, in order. If
+    *executor* is not :data:`None`, the calls are made by its workers,
+    taking batches of *batch_size* from *iterable* at a time to bound memory
+    use.
+    """
+    if executor is None:
+        yield from map(func, iterable)
+    else:
+        iterable = iter(iterable)
+        while True:
+            batch = list(islice(iterable, batch_size))
+            if not batch:
+                break
+            yield from executor.map(func, batch, chunksize=64)
+
+
+def format_entries(entries, jobs=1, *, dedup=False, group=False, **kwargs):
+    """
+    Yield the formatted text of *entries*, in order. If *jobs* is greater
+    than 1, entries are parsed and formatted by that many processes. The
+    *kwargs* are passed verbatim to :func:`format_entry`.
+
+    If *dedup* is :data:`True`, duplicate items are removed (see
+    :func:`dedup_items`). If *group* is :data:`True`, items mentioning the
+    same component are grouped together (see :func:`group_items`).
+    """
+    with (
+        ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else
+        nullcontext()
+    ) as executor:
+        if not (dedup or group):
+            yield from imap(executor, partial(format_entry, **kwargs), entries)
+        else:
+            items = (
+                item
+                for items in imap(executor, entry_items, entries)
+                for item in items
+            )
+            if dedup:
+                items = dedup_items(items)
+            if group:
+                items = group_items(items)
+            yield from imap(
+                executor, partial(format_items, **kwargs),
+                ([item] for item in items))
 
 
 def main(args=None):
@@ -82,19 +255,39 @@ def main(args=None):
         '-s', '--separator', type=str, metavar='STR', default='### END ###',
         help="The string used to terminate each commit log message. Default: "
         "%(default)r")
+    parser.add_argument(
+        '-j', '--jobs', type=int, metavar='N', default=1,
+        help="The number of processes with which to format messages; output "
+        "order is preserved regardless. Default: %(default)s")
+    parser.add_argument(
+        '-d', '--dedup', action='store_true',
+        help="Remove duplicated items, e.g. from cherry-picked commits")
+    parser.add_argument(
+        '-g', '--group', action='store_true',
+        help="Group items which start with the same file(s), e.g. "
+        "\"debian/control: ...\", under a single item for the file(s), "
+        "after all other items")
     parser.add_argument(
         'source', type=argparse.FileType('r'), nargs='?', default=sys.stdin,
         help="The source of commit messages to parse and format. Defaults to "
         "stdin if not specified")
     config = parser.parse_args(args)
 
-    for entry in split_entries(config.source, config.separator):
-        for indent, item in split_items(filter_items(entry)):
-            for line in format_item(item, bullet=config.bullet,
-                                    indent=config.indent + indent,
-                                    width=config.width):
-                sys.stdout.write(line)
-                sys.stdout.write('\n')
+    # Write the output in batches rather than line by line
+    batch = []
+    batch_size = 0
+    for text in format_entries(
+        split_entries(config.source, config.separator), jobs=config.jobs,
+        dedup=config.dedup, group=config.group, bullet=config.bullet,
+        indent=config.indent, width=config.width
+    ):
+        batch.append(text)
+        batch_size += len(text)
+        if batch_size >= 65536:
+            sys.stdout.write(''.join(batch))
+            batch.clear()
+            batch_size = 0
+    sys.stdout.write(''.join(batch))
 
 
 if __name__ == '__main__':
@@ -1,16 +1,28 @@
 #!/usr/bin/python3
 
 import os
+import re
 import math
+import mmap
 import time
+import fcntl
+import ctypes
+import marshal
+import signal
 import struct
+import argparse
 import tempfile
+import selectors
+import statistics
+import tracemalloc
 import datetime as dt
 import subprocess as sp
+from array import array
 from pathlib import Path
 from getpass import getuser
 from functools import lru_cache
 from itertools import tee
+from collections import namedtuple
 
 try:
     from cbor2 import load, dump
@@ -18,6 +30,20 @@ except ImportError:
     from marshal import load, dump
 
 
+# The roots of the file-systems the stats read and write; the benchmark points
+# these at fixtures
+cache_root = Path('/dev/shm')
+proc_root = Path('/proc')
+sys_root = Path('/sys')
+# Where histories that must survive a reboot (unlike those in the cache_root
+# on tmpfs) are kept
+log_dir = Path.home() / '.cache' / 'tmux-status'
+# If set (from the environment), the path of a file to which Stat.__str__
+# and Stat.render append how long each call took, and whether it had to
+# refresh the value
+timing_log = os.environ.get('TMUX_STATUS_TIMING')
+
+
 def pairwise(it):
     a, b = tee(it)
     next(b, None)
@@ -71,9 +97,22 @@ def format_duration(seconds):
             return f'{secs:d}s'
 
 
+def log_timing(name, cold, elapsed):
+    fd = os.open(
+        timing_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_CLOEXEC,
+        0o644)
+    try:
+        # A single write to an O_APPEND file, so concurrent renders don't
+        # interleave their lines
+        os.write(fd, (
+            f'{time.time():.3f} {name} {"cold" if cold else "warm"} '
+            f'{elapsed * 1_000_000:.0f}us\n').encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
 @lru_cache(maxsize=1)
 def cache_dir():
-    cache_root = Path('/dev/shm')
     user = getuser()
     prefix = f'tmux-{user}-'
     for d in cache_root.glob(prefix + '*'):
@@ -86,39 +125,545 @@ class StaleError(ValueError):
     pass
 
 
+class Inotify:
+    """
+    A minimal :mod:`ctypes` binding of the Linux inotify API. The instance is
+    selectable (via :meth:`fileno`) and non-blocking; :meth:`read` returns
+    all pending events as a list of (watched path, mask, name) tuples.
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    event = struct.Struct('=iIII')
+
+    def __init__(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        try:
+            init = libc.inotify_init1
+            self._add_watch = libc.inotify_add_watch
+        except AttributeError:
+            raise OSError('inotify is not supported')
+        self._add_watch.argtypes = (
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._watches = {}
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        os.close(self._fd)
+
+    def add_watch(self, path, mask):
+        wd = self._add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        self._watches[wd] = Path(path)
+
+    def read(self):
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = self.event.unpack_from(data, offset)
+                offset += self.event.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                events.append((self._watches.get(wd), mask, name))
+
+
+class FileCache:
+    """
+    The original cache backend: one CBOR (or marshal) file per stat under
+    *path*, using the file's modification time as the sample's timestamp.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, name):
+        try:
+            with (self.path / f'{name}.cbor').open('rb') as f:
+                return os.fstat(f.fileno()).st_mtime, load(f)
+        except FileNotFoundError:
+            raise KeyError(name)
+
+    def store(self, name, value):
+        with (self.path / f'{name}.cbor').open('wb') as f:
+            dump(value, f)
+
+
+class SharedCache:
+    """
+    A cache backend holding every stat's timestamp and value in fixed-size
+    slots of a single memory-mapped file at *path*, so that a render costs a
+    read of the mapping rather than a stat, open and load per stat.
+
+    Writers serialize with :func:`fcntl.flock` and bump a generation counter
+    in the header before and after each write (a seqlock); readers take no
+    lock but retry if the counter was odd, or changed, while they read.
+    """
+    magic = b'TMXS'
+    slots = 32
+    header = struct.Struct('=4s4xQ')
+    slot = struct.Struct('=16sdH102s')
+    retries = 100
+
+    def __init__(self, path):
+        self.size = self.header.size + self.slots * self.slot.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size != self.size:
+                    os.ftruncate(self._fd, 0)
+                    os.ftruncate(self._fd, self.size)
+                    os.pwrite(self._fd, self.header.pack(self.magic, 0), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(self._fd, self.size)
+        except Exception:
+            os.close(self._fd)
+            raise
+        if self._map[:len(self.magic)] != self.magic:
+            raise OSError(f'{path} is not a stats cache')
+        self._offsets = {}
+
+    def _generation(self):
+        magic, gen = self.header.unpack_from(self._map)
+        return gen
+
+    def _read(self, offset, size, locked=False):
+        if locked:
+            # The caller holds the lock, so there is no writer to race
+            return self._map[offset:offset + size]
+        for attempt in range(self.retries):
+            gen = self._generation()
+            if not gen & 1:
+                data = self._map[offset:offset + size]
+                if self._generation() == gen:
+                    return data
+        # A writer died mid-write (or is very slow); once we can take the
+        # lock, the writer is gone so close its generation and carry on
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            gen = self._generation()
+            if gen & 1:
+                self.header.pack_into(self._map, 0, self.magic, gen + 1)
+            return self._map[offset:offset + size]
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _find(self, key, locked=False):
+        try:
+            return self._offsets[key]
+        except KeyError:
+            pass
+        # Names are only ever added to slots, never removed, so rescanning
+        # the whole table is only required for names we haven't seen
+        table = self._read(
+            self.header.size, self.slots * self.slot.size, locked=locked)
+        for index in range(self.slots):
+            offset = index * self.slot.size
+            name = table[offset:offset + 16].rstrip(b'\0')
+            if not name:
+                break
+            self._offsets[name] = self.header.size + offset
+        return self._offsets.get(key)
+
+    def load(self, name):
+        key = name.encode('utf-8')
+        offset = self._find(key)
+        if offset is None:
+            raise KeyError(name)
+        _, timestamp, length, data = self.slot.unpack(
+            self._read(offset, self.slot.size))
+        try:
+            return timestamp, marshal.loads(data[:length])
+        except (EOFError, ValueError, TypeError):
+            raise KeyError(name)
+
+    def store(self, name, value):
+        key = name.encode('utf-8')
+        data = marshal.dumps(value)
+        if len(data) > self.slot.size - 26:
+            raise ValueError(f'{name} value is too large for the stats cache')
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            offset = self._find(key, locked=True)
+            if offset is None:
+                if len(self._offsets) >= self.slots:
+                    raise ValueError('stats cache is full')
+                offset = self.header.size + len(self._offsets) * self.slot.size
+                self._offsets[key] = offset
+            gen = self._generation()
+            # An odd generation here was left by a writer that died; round
+            # it up so ours is odd for the duration of the write
+            gen += gen & 1
+            self.header.pack_into(self._map, 0, self.magic, gen + 1)
+            self.slot.pack_into(
+                self._map, offset, key, time.time(), len(data), data)
+            self.header.pack_into(self._map, 0, self.magic, gen + 2)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class Ring:
+    """
+    A ring buffer of the last *size* records, each of *width* values of the
+    :mod:`array` *typecode*, kept in a memory-mapped file at *path* so that it
+    survives between runs without ever growing.
+
+    Appends are serialized with :func:`fcntl.flock` and write the record
+    before advancing the header; readers take no lock.
+    """
+    header = struct.Struct('=QQ')
+
+    def __init__(self, path, typecode, width, size):
+        self.width = width
+        self.size = size
+        length = self.header.size + size * width * array(typecode).itemsize
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size != length:
+                    # Layout changed (or new file); start a fresh history
+                    os.ftruncate(self._fd, 0)
+                    os.ftruncate(self._fd, length)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(self._fd, length)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._data = memoryview(self._map)[self.header.size:].cast(typecode)
+
+    def __len__(self):
+        head, count = self.header.unpack_from(self._map)
+        return count
+
+    def __iter__(self):
+        head, count = self.header.unpack_from(self._map)
+        for index in range(head - count, head):
+            start = (index % self.size) * self.width
+            yield tuple(self._data[start:start + self.width])
+
+    def append(self, *record):
+        assert len(record) == self.width
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            head, count = self.header.unpack_from(self._map)
+            start = head * self.width
+            for offset, value in enumerate(record):
+                self._data[start + offset] = value
+            self.header.pack_into(
+                self._map, 0, (head + 1) % self.size, min(count + 1, self.size))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+@lru_cache()
+def history(name, typecode, width, size, directory=None):
+    if directory is None:
+        directory = cache_dir()
+    try:
+        return Ring(directory / f'{name}.ring', typecode, width, size)
+    except OSError as err:
+        raise ValueError(f'unable to map {name} history: {err}')
+
+
+@lru_cache()
+def physical_interface(name):
+    return (sys_root / 'class/net' / name / 'device').exists()
+
+
+@lru_cache(maxsize=1)
+def smbus():
+    try:
+        from smbus import SMBus
+    except ImportError:
+        try:
+            from smbus2 import SMBus
+        except ImportError:
+            raise ValueError('no I2C module')
+    return SMBus
+
+
+@lru_cache(maxsize=1)
+def stats_cache():
+    try:
+        return SharedCache(cache_dir() / 'stats.shm')
+    except OSError:
+        return FileCache(cache_dir())
+
+
+MemInfo = namedtuple('MemInfo', ('total', 'available', 'swap_total', 'swap_free'))
+LoadAvg = namedtuple('LoadAvg', ('load1', 'load5', 'load15', 'running', 'tasks'))
+Uptime = namedtuple('Uptime', ('up', 'idle'))
+CPUTimes = namedtuple('CPUTimes', (
+    'user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal'))
+NetDev = namedtuple('NetDev', ('rx', 'tx'))
+
+
+class ProcSampler:
+    """
+    Reads files under *root* (typically ``/proc``) at most once per tick,
+    parsing each into a typed snapshot shared by every consumer. Call
+    :meth:`tick` to discard the current snapshots; the next access of each
+    property re-reads its source.
+    """
+    meminfo_re = re.compile(rb'^(\w+):\s+(\d+)', re.MULTILINE)
+    loadavg_re = re.compile(rb'([\d.]+) ([\d.]+) ([\d.]+) (\d+)/(\d+)')
+    uptime_re = re.compile(rb'([\d.]+) ([\d.]+)')
+    cpu_re = re.compile(rb'^cpu +' + rb' '.join([rb'(\d+)'] * 8), re.MULTILINE)
+    netdev_re = re.compile(
+        rb'^ *([^:\s]+): *(\d+)(?: +\d+){7} +(\d+)', re.MULTILINE)
+
+    def __init__(self, root='/proc'):
+        self.root = Path(root)
+        self._samples = {}
+
+    def tick(self):
+        self._samples.clear()
+
+    def _read(self, name):
+        fd = os.open(self.root / name, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            chunks = []
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+        finally:
+            os.close(fd)
+
+    def _sample(self, name, parse):
+        try:
+            return self._samples[name]
+        except KeyError:
+            value = self._samples[name] = parse(self._read(name))
+            return value
+
+    @property
+    def meminfo(self):
+        return self._sample('meminfo', self._parse_meminfo)
+
+    @property
+    def loadavg(self):
+        return self._sample('loadavg', self._parse_loadavg)
+
+    @property
+    def uptime(self):
+        return self._sample('uptime', self._parse_uptime)
+
+    @property
+    def cpu(self):
+        return self._sample('stat', self._parse_cpu)
+
+    @property
+    def netdev(self):
+        return self._sample('net/dev', self._parse_netdev)
+
+    @classmethod
+    def _parse_meminfo(cls, data):
+        values = dict(cls.meminfo_re.findall(data))
+        try:
+            total = int(values[b'MemTotal']) * 1024
+            if b'MemAvailable' in values:
+                available = int(values[b'MemAvailable']) * 1024
+            else:
+                available = (
+                    int(values[b'MemFree']) + int(values[b'Cached'])) * 1024
+        except KeyError:
+            raise ValueError('MemFree and MemTotal not found')
+        return MemInfo(
+            total, available,
+            int(values.get(b'SwapTotal', 0)) * 1024,
+            int(values.get(b'SwapFree', 0)) * 1024)
+
+    @classmethod
+    def _parse_loadavg(cls, data):
+        m = cls.loadavg_re.match(data)
+        if not m:
+            raise ValueError('unable to parse loadavg')
+        load1, load5, load15, running, tasks = m.groups()
+        return LoadAvg(
+            float(load1), float(load5), float(load15), int(running), int(tasks))
+
+    @classmethod
+    def _parse_uptime(cls, data):
+        m = cls.uptime_re.match(data)
+        if not m:
+            raise ValueError('unable to parse uptime')
+        return Uptime(*(float(value) for value in m.groups()))
+
+    @classmethod
+    def _parse_cpu(cls, data):
+        m = cls.cpu_re.search(data)
+        if not m:
+            raise ValueError('unable to parse cpu times')
+        return CPUTimes(*(int(value) for value in m.groups()))
+
+    @classmethod
+    def _parse_netdev(cls, data):
+        return {
+            iface.decode('utf-8'): NetDev(int(rx), int(tx))
+            for iface, rx, tx in cls.netdev_re.findall(data)
+        }
+
+
+@lru_cache(maxsize=1)
+def proc():
+    return ProcSampler(proc_root)
+
+
 class Stat:
     timeout = 15
     fg = 'brightwhite'
     bg = 'black'
+    # If non-zero, the number of samples to keep in a history ring, rendered
+    # as a sparkline by _graph in place of a single bar
+    spark = 0
+    # If set, the daemon re-renders the stat this often rather than every
+    # timeout; for stats whose refresh completes in the background
+    poll = None
+    # If set, the stats cache name (at most 16 bytes) under which the device
+    # found by _discover is kept, and the number of seconds to trust a failure
+    # to find one before probing again
+    device = None
+    reprobe = 300
+
+    def watch(self):
+        # Returns a selectable the daemon should watch on our behalf, calling
+        # notify when it's readable; None if the stat is purely timed
+        return None
+
+    def notify(self):
+        # Returns the delay after which the daemon should re-render the stat,
+        # or None if nothing relevant changed
+        return None
 
     def __str__(self):
+        start = time.perf_counter()
+        cold = False
         try:
             try:
                 value = self._cached_value()
             except StaleError:
-                value = self._raw_value()
-                with self._cache_file().open('wb') as f:
-                    dump(value, f)
+                cold = True
+                value = self.refresh()
         except ValueError:
-            return ''
-        return self._format_value(value)
+            s = ''
+        else:
+            s = self._format_value(value)
+        if timing_log:
+            log_timing(self.name, cold, time.perf_counter() - start)
+        return s
+
+    def render(self):
+        # Used by the daemon, which keeps its own schedule and thus always
+        # wants a fresh sample rather than whatever is in the cache
+        start = time.perf_counter()
+        try:
+            value = self.refresh()
+        except ValueError:
+            s = ''
+        else:
+            s = self._format_value(value)
+        if timing_log:
+            log_timing(self.name, True, time.perf_counter() - start)
+        return s
+
+    def refresh(self):
+        value = self._raw_value()
+        stats_cache().store(self.name, value)
+        if self.spark:
+            pct = max(0, min(100, int(self._spark_value(value))))
+            self._spark_ring().append(pct)
+        return value
+
+    def _spark_ring(self):
+        return history(f'{self.name}-spark', 'B', 1, self.spark)
+
+    def _spark_value(self, value):
+        raise NotImplementedError
 
-    def _cache_file(self):
-        return cache_dir() / f'{self.name}.cbor'
+    def _graph(self, pct):
+        if self.spark:
+            try:
+                ring = self._spark_ring()
+            except ValueError:
+                pass
+            else:
+                return ''.join(
+                    bar(pct) for pct, in ring).rjust(self.spark)
+        return bar(pct)
 
     def _cached_value(self):
-        path = self._cache_file()
         try:
-            if time.time() > path.stat().st_mtime + self.timeout:
-                raise StaleError()
-        except FileNotFoundError:
+            timestamp, value = stats_cache().load(self.name)
+        except KeyError:
             raise StaleError()
-        with path.open('rb') as f:
-            return load(f)
+        if time.time() > timestamp + self.timeout:
+            raise StaleError()
+        return value
 
     def _raw_value(self):
         raise NotImplementedError
 
+    def _discover(self):
+        # Returns a (marshallable) description of the stat's device, or None
+        # if there isn't one
+        raise NotImplementedError
+
+    def _device(self, rediscover=False):
+        # Returns the device found by the last _discover (by any process),
+        # only probing again if there's none in the cache, the last probe
+        # found nothing and is older than reprobe, or *rediscover* is set
+        cache = stats_cache()
+        if not rediscover:
+            try:
+                timestamp, found = cache.load(self.device)
+            except KeyError:
+                pass
+            else:
+                if found is not None or time.time() < timestamp + self.reprobe:
+                    if found is None:
+                        raise ValueError(f'no {self.name} device')
+                    return found
+        found = self._discover()
+        cache.store(self.device, found)
+        if found is None:
+            raise ValueError(f'no {self.name} device')
+        return found
+
+    def _read_device(self, read):
+        # Calls *read* with the cached device; if that fails the device has
+        # gone or moved (zones renumbered, battery swapped, etc.) so probe
+        # once more before giving up
+        try:
+            return read(self._device())
+        except OSError:
+            pass
+        try:
+            return read(self._device(rediscover=True))
+        except OSError as err:
+            raise ValueError(f'unable to read {self.name}: {err}')
+
     def _format_value(self, value):
         if value:
             prefix = suffix = ' '
@@ -133,70 +678,171 @@ class Stat:
 class UpdatesStat(Stat):
     name = 'updates'
     timeout = 59
+    poll = 5
     bg = 'red'
+    # The maximum run-time of the apt-get simulation
+    limit = 300
+    lock_path = Path('/dev/shm/tmux-status-updates.lock')
+    command = ('apt-get', '-s', '-o', 'Debug::NoLocking=true', 'upgrade')
+    sources = ('/var/lib/apt', '/var/lib/apt/lists', '/var/log/dpkg.log')
+    # When watching, the time of the last relevant change to the sources,
+    # and the number of seconds to let apt or dpkg settle after a change
+    # before the count is considered stale
+    changed = None
+    settle = 5
 
     def _format_value(self, value):
         return super()._format_value(f'#[bright]{value}#[nobright]!' if value else '')
 
-    def _raw_value(self):
-        cache_file = self._cache_file()
-        pid = os.fork()
-        if pid == 0:  # child fork
-            temp_file = cache_file.with_suffix('.new')
-            lock_file = cache_file.with_suffix('.lock')
-            try:
-                # This would be better done with flock but ... I'm lazy
-                with lock_file.open('x'):
-                    cmd = [
-                        'apt-get',
-                        '-s',
-                        '-o', 'Debug::NoLocking=true',
-                        'upgrade']
-                    try:
-                        result = sp.run(cmd, stdout=sp.PIPE,
-                                        encoding='utf-8', check=True)
-                    except sp.CalledProcessError:
-                        pass
-                    else:
-                        count = sum(
-                            1 for line in result.stdout.splitlines()
-                            if line.startswith('Inst')
-                        )
-                        with temp_file.open('wb') as f:
-                            dump(count, f)
-                        temp_file.rename(cache_file)
-            except FileExistsError:
-                pass
-            else:
-                lock_file.unlink()
-            finally:
-                raise SystemExit(0)
+    def refresh(self):
+        # Never block on apt; serve the last good count immediately and leave
+        # a background job to update the cache when it's stale
         try:
-            with cache_file.open('rb') as f:
-                return load(f)
-        except FileNotFoundError:
+            return self._cached_value()
+        except StaleError:
+            pass
+        self._start_refresh()
+        try:
+            timestamp, count, started = self._load()
+        except KeyError:
             return 0
+        else:
+            return count
+
+    def _load(self):
+        # The cache holds the count along with the time the job which
+        # produced it started; anything that changed after that may not be
+        # reflected in the count, however recently it was stored
+        timestamp, value = stats_cache().load(self.name)
+        try:
+            count, started = value
+        except (TypeError, ValueError):
+            raise KeyError(self.name)
+        return timestamp, count, started
+
+    def _start_refresh(self):
+        # The lock is per-host (not per-user) so there is at most one apt-get
+        # simulation in flight. It is held by the detached grandchild via the
+        # descriptor it inherits, so it is released whenever that process
+        # exits, however it exits; there is no stale lock to clean up
+        try:
+            lock = os.open(
+                self.lock_path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        except PermissionError:
+            # Created by another user; a read-only descriptor will do
+            lock = os.open(self.lock_path, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            pid = os.fork()
+            if pid == 0:  # child fork
+                try:
+                    if os.fork() == 0:  # grandchild fork
+                        self._refresh_job(lock)
+                finally:
+                    # Don't unwind into the parent's (e.g. the daemon's)
+                    # cleanup
+                    os._exit(0)
+            os.waitpid(pid, 0)
+        finally:
+            os.close(lock)
+
+    def _refresh_job(self, lock):
+        os.setsid()
+        null = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(null, fd)
+        # Keep nothing of our parent's but the updates lock; in particular
+        # the daemon's flocked daemon.lock mustn't outlive it in us
+        os.closerange(3, lock)
+        os.closerange(lock + 1, os.sysconf('SC_OPEN_MAX'))
+        # Hard stop in case apt-get ignores the timeout below
+        signal.alarm(self.limit + 30)
+        # Re-open the cache; the parent's descriptor shares our flock so we
+        # couldn't serialize against it
+        stats_cache.cache_clear()
+        started = time.time()
+        try:
+            result = sp.run(self.command, stdout=sp.PIPE, encoding='utf-8',
+                            check=True, timeout=self.limit)
+        except (OSError, sp.SubprocessError):
+            # Re-stamp the last good count so readers keep getting it, and we
+            # don't retry until it goes stale again
+            try:
+                timestamp, count, _ = self._load()
+            except KeyError:
+                count = 0
+        else:
+            count = sum(
+                1 for line in result.stdout.splitlines()
+                if line.startswith('Inst')
+            )
+        stats_cache().store(self.name, (count, started))
+
+    def watch(self):
+        mask = (
+            Inotify.IN_CLOSE_WRITE | Inotify.IN_MOVED_TO |
+            Inotify.IN_MOVED_FROM | Inotify.IN_CREATE | Inotify.IN_DELETE)
+        try:
+            watcher = Inotify()
+            try:
+                changed = 0.0
+                for source in map(Path, self.sources):
+                    changed = max(changed, source.stat().st_mtime)
+                    # Watch the parent of files, so rotation doesn't lose us
+                    # the watch
+                    watcher.add_watch(
+                        source if source.is_dir() else source.parent, mask)
+            except OSError:
+                watcher.close()
+                raise
+        except OSError:
+            return None
+        self._watcher = watcher
+        self.changed = changed
+        return watcher
+
+    def notify(self):
+        relevant = False
+        for path, mask, name in self._watcher.read():
+            if mask & (Inotify.IN_Q_OVERFLOW | Inotify.IN_IGNORED):
+                relevant = True
+            elif str(path) in self.sources:
+                # apt's lock and partial download dir churn on every run
+                relevant |= name not in ('lock', 'partial')
+            else:
+                relevant |= str(path / name) in self.sources
+        if relevant:
+            self.changed = time.time()
+            return self.settle
+        return None
 
     def _cached_value(self):
-        cache_file = self._cache_file()
-        source_files = {
-            Path(d)
-            for d in ('/var/lib/apt', '/var/lib/apt/lists', '/var/log/dpkg.log')
-        }
         try:
-            cache_stat = cache_file.stat()
-        except FileNotFoundError:
+            timestamp, count, started = self._load()
+        except KeyError:
             raise StaleError()
+        if self.changed is not None:
+            # Watched by the daemon; only changes to the sources invalidate
+            # the count, so there's nothing to stat and no timer. While apt
+            # or dpkg is still busy, keep serving the old count
+            if (
+                started < self.changed and
+                time.time() - self.changed >= self.settle
+            ):
+                raise StaleError()
         else:
+            now = time.time()
             if any(
-                cache_stat.st_mtime < source.stat().st_mtime
-                for source in source_files
+                started < mtime and now - mtime >= self.settle
+                for mtime in (Path(d).stat().st_mtime for d in self.sources)
             ):
                 raise StaleError()
-            if dt.datetime.now().timestamp() - cache_stat.st_mtime > self.timeout:
+            if dt.datetime.now().timestamp() - timestamp > self.timeout:
                 raise StaleError()
-        with cache_file.open('rb') as f:
-            return load(f)
+        return count
 
 
 class UptimeStat(Stat):
@@ -209,9 +855,7 @@ class UptimeStat(Stat):
         return super()._format_value(format_duration(value))
 
     def _raw_value(self):
-        with open('/proc/uptime') as f:
-            up, idle = f.read().split()
-        return float(up)
+        return proc().uptime.up
 
 
 class LoadStat(Stat):
@@ -219,13 +863,17 @@ class LoadStat(Stat):
     timeout = 2
     fg = 'black'
     bg = 'green'
+    spark = 8
 
     def _format_value(self, value):
         pct = percent(value, 0, os.cpu_count())
-        return super()._format_value(f'{value:.2f}{bar(pct)}')
+        return super()._format_value(f'{value:.2f}{self._graph(pct)}')
+
+    def _spark_value(self, value):
+        return percent(value, 0, os.cpu_count())
 
     def _raw_value(self):
-        return os.getloadavg()[0]
+        return proc().loadavg.load1
 
 
 class CPUTempStat(Stat):
@@ -233,18 +881,30 @@ class CPUTempStat(Stat):
     timeout = 3
     fg = 'black'
     bg = '#ffdd00'
+    spark = 8
+    device = 'cputemp-dev'
 
     def _format_value(self, value):
-        return super()._format_value(f'{value:.0f}°C')
+        graph = self._graph(self._spark_value(value)) if self.spark else ''
+        return super()._format_value(f'{value:.0f}°C{graph}')
 
-    def _raw_value(self):
-        for path in Path('/sys/class/thermal').glob('thermal_zone*'):
+    def _spark_value(self, value):
+        return percent(value, 30, 90)
+
+    def _discover(self):
+        for path in sorted((sys_root / 'class/thermal').glob('thermal_zone*')):
             try:
                 if (path / 'type').read_text().rstrip() in ('TCPU', 'cpu-thermal'):
-                    return int((path / 'temp').read_text()) / 1000
+                    return path.name
             except FileNotFoundError:
                 pass
-        raise ValueError('no thermal zone')
+        return None
+
+    def _raw_value(self):
+        return self._read_device(
+            lambda zone: int(
+                (sys_root / 'class/thermal' / zone / 'temp').read_text()
+            ) / 1000)
 
 
 class LaptopBatteryStat(Stat):
@@ -252,19 +912,32 @@ class LaptopBatteryStat(Stat):
     timeout = 31
     fg = 'white'
     bg = '#ff6600'
+    device = 'laptop_bat-dev'
 
     def _format_value(self, value):
         volts, capacity = value
         return super()._format_value(f'{volts:.1f}V#[bright]{bar(capacity)}#[nobright]')
 
+    def _discover(self):
+        for path in sorted((sys_root / 'class/power_supply').glob('*')):
+            try:
+                if (
+                    (path / 'type').read_text().rstrip() == 'Battery' and
+                    (path / 'capacity').exists() and
+                    (path / 'voltage_now').exists()
+                ):
+                    return path.name
+            except FileNotFoundError:
+                pass
+        return None
+
     def _raw_value(self):
-        bat_path = Path('/sys/class/power_supply/BAT1')
-        try:
+        def read(supply):
+            bat_path = sys_root / 'class/power_supply' / supply
             capacity = int((bat_path / 'capacity').read_text())
             volts = int((bat_path / 'voltage_now').read_text()) / 1_000_000
-        except FileNotFoundError:
-            raise ValueError('no battery found')
-        return volts, capacity
+            return volts, capacity
+        return self._read_device(read)
 
 
 class PiBatteryStat(Stat):
@@ -272,8 +945,15 @@ class PiBatteryStat(Stat):
     timeout = 31
     fg = 'brightwhite'
     bg = '#ff6600'
+    device = 'pi_battery-dev'
+    bus = 1
     addr = 0x36
     scale = 78.125 / 1_000_000
+    # The number of (timestamp, volts, capacity) records kept in the battery
+    # log; about 3½ days of samples at the timeout
+    log_size = 10000
+    # The open bus, kept for the life of the process (the daemon's, mostly)
+    _handle = None
     cap_volts = {
         # Current values from discharge curve of Samsung 35E cells
         # %cap volts
@@ -304,34 +984,59 @@ class PiBatteryStat(Stat):
         volts, capacity = value
         return super()._format_value(f'{volts:.1f}V{bar(capacity)}')
 
-    def _raw_value(self):
+    def _discover(self):
         try:
-            from smbus import SMBus
-        except ImportError:
-            try:
-                from smbus2 import SMBus
-            except ImportError:
-                raise ValueError('no I2C module')
+            bus = smbus()(self.bus)
+        except (ValueError, OSError):
+            return None
         try:
-            bus = SMBus(1)
+            bus.read_byte(self.addr)
         except OSError:
-            raise ValueError('no I2C bus')
+            bus.close()
+            return None
+        self._close()
+        self._handle = bus
+        return self.bus
+
+    def _close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _read(self, bus):
+        if self._handle is None:
+            self._handle = smbus()(bus)
         try:
+            value = self._handle.read_word_data(self.addr, 2)
+        except OSError:
+            self._close()
+            raise
+        # Byte-swap big-endian value
+        value, = struct.unpack('<H', struct.pack('>H', value))
+        return value * self.scale
+
+    def log(self, create=True):
+        # Returns the battery log, kept in the persistent log_dir as it's
+        # most wanted after the battery ran flat; unless *create* is set,
+        # only if some process has already started one
+        name = f'{self.name}-log'
+        if create:
             try:
-                chip = bus.read_byte(self.addr)
-            except OSError:
-                raise ValueError('no battery chip found')
-            value = bus.read_word_data(self.addr, 2)
-            # Byte-swap big-endian value
-            value, = struct.unpack('<H', struct.pack('>H', value))
-            volts = value * self.scale
-            cap = self._convert_volts(volts)
-            now = dt.datetime.now()
-            with (Path.home() / 'bat.out').open('a') as f:
-                f.write(f'{now:%Y-%m-%d %H:%M:%S},{volts},{cap}\n')
-            return volts, self._convert_volts(volts)
-        finally:
-            bus.close()
+                log_dir.mkdir(parents=True, exist_ok=True)
+            except OSError as err:
+                raise ValueError(f'unable to create {log_dir}: {err}')
+        elif not (log_dir / f'{name}.ring').exists():
+            raise ValueError('no battery log')
+        return history(name, 'd', 3, self.log_size, log_dir)
+
+    def _raw_value(self):
+        volts = self._read_device(self._read)
+        cap = self._convert_volts(volts)
+        try:
+            self.log().append(time.time(), volts, cap)
+        except ValueError:
+            pass
+        return volts, cap
 
 
 class NetStat(Stat):
@@ -339,10 +1044,41 @@ class NetStat(Stat):
     timeout = 3
     fg = 'white'
     bg = 'magenta'
+    # Rates are averaged over (roughly) the last *window* seconds of the
+    # *samples* most recent counter samples
+    window = 15
+    samples = 16
+    # The interfaces to count, or None for every physical interface; virtual
+    # ones (bridges, veths, tunnels, ifbs, etc.) would count traffic twice
+    interfaces = None
 
     def _format_value(self, value):
-        up_count, up_diff, down_count, down_diff = value
-        return super()._format_value(f'↑{format_binary_size(diff)}')
+        up, down = value
+        return super()._format_value(
+            f'↑{format_binary_size(up)}↓{format_binary_size(down)}')
+
+    def _raw_value(self):
+        now = time.monotonic()
+        rx = tx = 0
+        for iface, counters in proc().netdev.items():
+            if (
+                iface in self.interfaces if self.interfaces is not None else
+                physical_interface(iface)
+            ):
+                rx += counters.rx
+                tx += counters.tx
+        ring = history(self.name, 'd', 3, self.samples)
+        ring.append(now, rx, tx)
+        for then, then_rx, then_tx in ring:
+            if now - then <= self.window:
+                break
+        if then >= now:
+            raise ValueError('need two samples for a rate')
+        # Counters go backwards when an interface disappears; just clamp
+        return (
+            max(0, tx - then_tx) / (now - then),
+            max(0, rx - then_rx) / (now - then),
+        )
 
 
 class StorageStat(Stat):
@@ -353,35 +1089,25 @@ class StorageStat(Stat):
 
     def _format_value(self, value):
         total, used = value
-        return super()._format_value(f'{format_binary_size(total)}{bar(used)}')
+        return super()._format_value(
+            f'{format_binary_size(total)}{self._graph(used)}')
+
+    def _spark_value(self, value):
+        total, used = value
+        return used
 
 
 class MemStat(StorageStat):
     name = 'mem'
     fg = 'black'
     bg = 'cyan'
+    spark = 8
 
     def _raw_value(self):
-        values = {}
-        labels = {'MemTotal:', 'MemAvailable:', 'MemFree:', 'Cached:'}
-        with open('/proc/meminfo', 'r') as f:
-            for line in f:
-                label, value, units = line.split()
-                if label in labels:
-                    values[label] = int(value) * 1024
-                    if {'MemTotal:', 'MemAvailable:'} <= values.keys():
-                        total = values['MemTotal:']
-                        free = values['MemAvailable:']
-                        break
-                    elif {'MemTotal:', 'MemFree:', 'Cached:'} <= values.keys():
-                        total = values['MemTotal:']
-                        free = values['MemFree:'] + values['Cached:']
-                        break
-            else:
-                raise ValueError('MemFree and MemTotal not found')
-        if not total:
+        mem = proc().meminfo
+        if not mem.total:
             raise ValueError('no memory found?!')
-        return total, 100 - percent(free, 0, total)
+        return mem.total, 100 - percent(mem.available, 0, mem.total)
 
 
 class SwapStat(StorageStat):
@@ -389,23 +1115,10 @@ class SwapStat(StorageStat):
     bg = 'brightblue'
 
     def _raw_value(self):
-        values = {}
-        labels = {'SwapTotal:', 'SwapFree:'}
-        with open('/proc/meminfo', 'r') as f:
-            for line in f:
-                label, value, units = line.split()
-                if label in labels:
-                    assert units == 'kB'
-                    values[label] = int(value) * 1024
-                    if {'SwapTotal:', 'SwapFree:'} == values.keys():
-                        total = values['SwapTotal:']
-                        free = values['SwapFree:']
-                        break
-            else:
-                raise ValueError('SwapTotal and SwapFree not found')
-        if not total:
+        mem = proc().meminfo
+        if not mem.swap_total:
             raise ValueError('no swap found')
-        return total, 100 - percent(free, 0, total)
+        return mem.swap_total, 100 - percent(mem.swap_free, 0, mem.swap_total)
 
 
 class DiskStat(StorageStat):
@@ -420,17 +1133,325 @@ class DiskStat(StorageStat):
         return total, 100 - percent(stat.f_bfree, 0, stat.f_blocks)
 
 
-if __name__ == '__main__':
+def status_line(stats, rendered):
+    s = ''.join(rendered)
+    s += f'#[default,fg={stats[-1].bg},reverse]#[default]'
+    return s
+
+
+class StatusDaemon:
+    """
+    Keeps all *stats* in memory, re-sampling each one when its timeout expires,
+    and writes the rendered status line to :attr:`path` whenever it changes.
+    The tmux status line then only needs to ``cat`` that file. The file is
+    touched at least every :attr:`heartbeat` seconds so that, should the
+    daemon die without removing it, the status line can tell it's stale.
+
+    If *server_pid* is specified, the daemon exits when that process (the
+    tmux server) goes away.
+    """
+    heartbeat = 10
+
+    def __init__(self, stats, server_pid=None):
+        self.stats = stats
+        self.server_pid = server_pid
+        self.path = cache_dir() / 'status'
+
+    def run(self):
+        with (cache_dir() / 'daemon.lock').open('w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another daemon is already serving this user
+                return
+            try:
+                self._serve()
+            finally:
+                self.path.unlink(missing_ok=True)
+
+    def _serve(self):
+        due = [0.0] * len(self.stats)
+        rendered = [''] * len(self.stats)
+        last = None
+        written = 0.0
+        with selectors.DefaultSelector() as selector:
+            for index, stat in enumerate(self.stats):
+                watcher = stat.watch()
+                if watcher is not None:
+                    selector.register(watcher, selectors.EVENT_READ, index)
+            while self._server_alive():
+                proc().tick()
+                now = time.monotonic()
+                for index, stat in enumerate(self.stats):
+                    if due[index] <= now:
+                        try:
+                            rendered[index] = stat.render()
+                        except OSError:
+                            # One broken stat mustn't take the whole status
+                            # line down with it
+                            rendered[index] = ''
+                        due[index] = now + (stat.poll or stat.timeout)
+                s = status_line(self.stats, rendered)
+                if s != last or now - written >= self.heartbeat:
+                    if self._write(s, touch=(s == last)):
+                        last = s
+                    # Even on failure, so a persistent one is retried at the
+                    # heartbeat rather than continuously
+                    written = now
+                timeout = max(0, min(
+                    min(due), written + self.heartbeat) - time.monotonic())
+                for key, events in selector.select(timeout):
+                    delay = self.stats[key.data].notify()
+                    if delay is not None:
+                        due[key.data] = time.monotonic() + delay
+
+    def _server_alive(self):
+        if self.server_pid is None:
+            return True
+        try:
+            os.kill(self.server_pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _write(self, s, touch=False):
+        # Writes the status line *s*, or if *touch* is set and the file
+        # (which should already contain *s*) still exists, just updates its
+        # modification time. Returns whether this succeeded
+        try:
+            if touch:
+                try:
+                    os.utime(self.path)
+                    return True
+                except FileNotFoundError:
+                    # Removed from under us (e.g. by a tmpfs cleanup)
+                    pass
+            temp_file = self.path.with_suffix('.new')
+            temp_file.write_text(s + '\n', encoding='utf-8')
+            temp_file.replace(self.path)
+            return True
+        except OSError:
+            return False
+
+
+def make_fixtures(root):
+    """
+    Populate *root* with fixture ``proc``, ``sys``, and ``var`` trees
+    containing everything the stats read.
+    """
+    files = {
+        'proc/meminfo':
+            'MemTotal:       16318412 kB\n'
+            'MemFree:         1023412 kB\n'
+            'MemAvailable:    9123412 kB\n'
+            'Cached:          6123412 kB\n'
+            'SwapTotal:       2097148 kB\n'
+            'SwapFree:        1597148 kB\n',
+        'proc/loadavg': '0.52 0.58 0.59 2/1234 56789\n',
+        'proc/uptime': '123456.78 987654.32\n',
+        'proc/stat':
+            'cpu  10132153 290696 3084719 46828483 16683 0 25195 0 0 0\n'
+            'cpu0 1393280 32966 572056 13343292 6130 0 17875 0 0 0\n',
+        'proc/net/dev':
+            'Inter-|   Receive                            |  Transmit\n'
+            ' face |bytes packets errs drop fifo frame compressed multicast'
+            '|bytes packets errs drop fifo colls carrier compressed\n'
+            '    lo: 1234 10 0 0 0 0 0 0 1234 10 0 0 0 0 0 0\n'
+            '  eth0: 987654321 123456 0 0 0 0 0 0 123456789 65432 0 0 0 0 0 0\n',
+        'sys/class/net/eth0/device/uevent': '',
+        'sys/class/power_supply/AC/type': 'Mains\n',
+        'sys/class/power_supply/BAT1/type': 'Battery\n',
+        'sys/class/power_supply/BAT1/capacity': '87\n',
+        'sys/class/power_supply/BAT1/voltage_now': '12345000\n',
+        'var/log/dpkg.log': '',
+    }
+    # Plenty of zones, with the CPU's last, as on many laptops
+    for zone in range(8):
+        files[f'sys/class/thermal/thermal_zone{zone}/type'] = (
+            'TCPU\n' if zone == 7 else 'acpitz\n')
+        files[f'sys/class/thermal/thermal_zone{zone}/temp'] = '45000\n'
+    for name, content in files.items():
+        path = Path(root) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    (Path(root) / 'var/lib/apt/lists').mkdir(parents=True, exist_ok=True)
+
+
+def io_syscalls():
+    # The number of read and write syscalls (only; mmap access, stat, open,
+    # flock, fork, etc. aren't counted) this process has made so far
+    try:
+        with open('/proc/self/io', 'rb') as f:
+            counters = dict(
+                line.split(b': ') for line in f.read().splitlines())
+        return int(counters[b'syscr']) + int(counters[b'syscw'])
+    except (OSError, KeyError, ValueError):
+        return 0
+
+
+def benchmark(stats, fixtures=None, iterations=100):
+    """
+    Render each of *stats* *iterations* times against the ``proc``, ``sys``
+    and ``var`` trees under *fixtures* (generated by :func:`make_fixtures` in
+    a temporary directory if not given), with a temporary cache. Prints the
+    median wall time, read/write syscalls, and peak allocation of each
+    stat's cold (refreshing) and warm (cached) renders.
+
+    Only read and write syscalls are counted (see :func:`io_syscalls`), so
+    renders served from the memory-mapped cache typically show none.
+    """
+    global cache_root, proc_root, sys_root, log_dir
+    saved = cache_root, proc_root, sys_root, log_dir
+    factories = (cache_dir, stats_cache, history, proc, physical_interface)
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        if fixtures is None:
+            fixtures = temp / 'fixtures'
+            make_fixtures(fixtures)
+        fixtures = Path(fixtures)
+        cache_root = temp
+        log_dir = temp / 'log'
+        proc_root = fixtures / 'proc'
+        sys_root = fixtures / 'sys'
+        for factory in factories:
+            factory.cache_clear()
+        try:
+            for stat in stats:
+                if isinstance(stat, UpdatesStat):
+                    # Measure the fork, not apt
+                    stat.lock_path = temp / 'updates.lock'
+                    stat.sources = tuple(
+                        str(fixtures / source.lstrip('/'))
+                        for source in stat.sources)
+                    stat.command = ('true',)
+            overhead = -(io_syscalls() - io_syscalls())
+
+            def quiesce(stat):
+                # Wait (untimed) for any job started by the last render to
+                # finish, so every cold render of UpdatesStat measures the
+                # fork rather than finding the lock held and giving up
+                if isinstance(stat, UpdatesStat):
+                    with stat.lock_path.open('a') as lock:
+                        fcntl.flock(lock, fcntl.LOCK_EX)
+
+            print(f'{"stat":<16s} {"mode":<5s} {"wall µs":>9s} '
+                  f'{"rd/wr calls":>11s} {"alloc KiB":>10s}')
+            for stat in stats:
+                for mode in ('cold', 'warm'):
+                    if mode == 'cold':
+                        # Anything cached is immediately stale
+                        stat.timeout = -1
+                    times = []
+                    syscalls = []
+                    for i in range(iterations):
+                        if mode == 'cold':
+                            quiesce(stat)
+                            proc().tick()
+                        before = io_syscalls()
+                        start = time.perf_counter_ns()
+                        str(stat)
+                        times.append(time.perf_counter_ns() - start)
+                        syscalls.append(io_syscalls() - before - overhead)
+                    # tracemalloc slows everything down, so allocations are
+                    # measured in a separate pass
+                    peaks = []
+                    tracemalloc.start()
+                    try:
+                        for i in range(iterations):
+                            if mode == 'cold':
+                                quiesce(stat)
+                                proc().tick()
+                            tracemalloc.reset_peak()
+                            base, peak = tracemalloc.get_traced_memory()
+                            str(stat)
+                            current, peak = tracemalloc.get_traced_memory()
+                            peaks.append(peak - base)
+                    finally:
+                        tracemalloc.stop()
+                    if mode == 'cold':
+                        del stat.timeout
+                    print(
+                        f'{stat.name:<16s} {mode:<5s} '
+                        f'{statistics.median(times) / 1000:9.1f} '
+                        f'{statistics.median(syscalls):11.0f} '
+                        f'{statistics.median(peaks) / 1024:10.1f}')
+        finally:
+            cache_root, proc_root, sys_root, log_dir = saved
+            for factory in factories:
+                factory.cache_clear()
+
+
+def tmux_server_pid():
+    # $TMUX is "socket-path,server-pid,session-index" when run under tmux
+    try:
+        return int(os.environ['TMUX'].split(',')[1])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def terminate(signum, frame):
+    raise SystemExit(0)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Generate the right-hand side of the tmux status line")
+    parser.add_argument(
+        '-d', '--daemon', action='store_true',
+        help="Run persistently, re-sampling each stat on its own timeout and "
+        "writing the rendered status line to 'status' in the cache directory "
+        "for the status line to cat")
+    parser.add_argument(
+        '--benchmark', action='store_true',
+        help="Measure the cost of rendering each stat, cold and warm, against "
+        "fixture proc and sys trees, instead of rendering the status line")
+    parser.add_argument(
+        '--fixtures', metavar='DIR', default=None,
+        help="With --benchmark, the directory containing the proc, sys, and "
+        "var trees to use; by default minimal fixtures are generated")
+    parser.add_argument(
+        '--iterations', metavar='N', type=int, default=100,
+        help="With --benchmark, the number of renders to measure for each "
+        "stat (default: %(default)s)")
+    parser.add_argument(
+        '--battery-log', action='store_true',
+        help="Print the Pi battery log (the most recent samples of voltage "
+        "and estimated capacity) as CSV, instead of rendering the status line")
+    config = parser.parse_args(args)
+
     stats = (
         UpdatesStat(),
         LaptopBatteryStat(),
         PiBatteryStat(),
         CPUTempStat(),
         LoadStat(),
+        NetStat(),
         MemStat(),
         SwapStat(),
         DiskStat(),
     )
-    s = ''.join(str(stat) for stat in stats)
-    s += f'#[default,fg={stats[-1].bg},reverse]#[default]'
-    print(s)
+    if config.battery_log:
+        try:
+            log = PiBatteryStat().log(create=False)
+        except ValueError:
+            log = ()
+        for timestamp, volts, cap in log:
+            print(f'{dt.datetime.fromtimestamp(timestamp):%Y-%m-%d %H:%M:%S},'
+                  f'{volts},{cap}')
+    elif config.benchmark:
+        benchmark(stats, config.fixtures, config.iterations)
+    elif config.daemon:
+        signal.signal(signal.SIGTERM, terminate)
+        signal.signal(signal.SIGHUP, terminate)
+        try:
+            StatusDaemon(stats, server_pid=tmux_server_pid()).run()
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(status_line(stats, [str(stat) for stat in stats]))
+
+
+if __name__ == '__main__':
+    main()